@@ -1,54 +1,252 @@
+import importlib.util
+import logging
 import os
-from typing import Optional, Any, Dict
-from pymongo import MongoClient
+import sys
+import time
+from functools import lru_cache
+from typing import Optional, Any, Dict, List, Tuple
+from pymongo import MongoClient, UpdateOne
 from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+from pymongo.write_concern import WriteConcern
 from bson import ObjectId
 from dotenv import load_dotenv
-from models.db_models import Job, StoryverseMetaData
+from models.db_models import AudioChunk, Job, StoryverseMetaData
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Intermediate pipeline writes are idempotent checkpoints and need not wait for the journal
+_CHECKPOINT_WRITE_CONCERN = WriteConcern(w=1, j=False)
+_FINAL_WRITE_CONCERN = WriteConcern(w=1, j=True)
+
+# Storyverse metadata rarely changes within a run, so validated instances are kept per process
+_META_DATA_TTL_SECONDS = 300
+_meta_data_cache: Dict[Tuple[str, str], Tuple[float, StoryverseMetaData]] = {}
+
+# Jobs are removed by MongoDB this long after createdAt
+_JOB_TTL_SECONDS = int(os.getenv('MONGODB_JOB_TTL_SECONDS', 7 * 86400))
+_ACTIVE_JOB_STATUSES = ["pending", "running"]
+
+# Databases whose job indexes were already ensured by this process
+_indexed_databases: set = set()
+
+# Wire compressors in preference order, with the module pymongo imports for each;
+# zstd comes from the stdlib on Python 3.14+ and from backports.zstd before that
+_COMPRESSOR_MODULES = {
+    "zstd": "compression.zstd" if sys.version_info >= (3, 14) else "backports.zstd",
+    "snappy": "snappy",
+}
+
+
+def _module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:  # parent package missing
+        return False
+
+
+def _available_compressors() -> str:
+    """MONGODB_COMPRESSORS if set, otherwise the compressors whose modules are installed"""
+    configured = os.getenv('MONGODB_COMPRESSORS')
+    if configured is not None:
+        return configured
+    return ",".join(
+        name for name, module in _COMPRESSOR_MODULES.items() if _module_available(module)
+    )
+
+
+_client_options: Dict[str, Any] = dict(maxPoolSize=50, minPoolSize=5, appname="sherlock-v2")
+_compressors = _available_compressors()
+if _compressors:
+    # An unsupported or empty compressor list only produces a warning, so pass it only when set
+    _client_options["compressors"] = _compressors
+
+# One client per process: MongoClient is thread-safe and pools its own connections
+_client = MongoClient(os.getenv('MONGODB_URI'), **_client_options)
+
+
+def close_client() -> None:
+    """Close the shared MongoClient, e.g. at process shutdown"""
+    _client.close()
+
+
+@lru_cache(maxsize=1024)
+def _object_id(job_id: str) -> ObjectId:
+    """Parse a job id once; a pipeline updates the same job many times"""
+    return ObjectId(job_id)
+
+
 class DatabaseManager:
     def __init__(self):
         self.mongo_uri = os.getenv('MONGODB_URI')
         self.db_name = os.getenv('MONGODB_DATABASE', 'sherlock-v2')
-        self.client = MongoClient(self.mongo_uri)
+        self.client = _client
         self.db = self.client[self.db_name]
+        # job_id -> fields to $set on the next flush; a later value for a field replaces the earlier one
+        self._pending_updates: Dict[str, Dict[str, Any]] = {}
+        self._ensure_job_indexes()
+    
+    def _ensure_job_indexes(self) -> None:
+        """
+        Create the TTL index on createdAt and a partial index over active jobs, once per process.
+        Indexes are an optimization, so a failure is logged rather than failing construction.
+        """
+        if self.db_name in _indexed_databases:
+            return
+        try:
+            self._ensure_ttl_index()
+        except OperationFailure as e:
+            logger.warning(f"Could not create TTL index on jobs.createdAt: {e}")
+        try:
+            # $in inside partialFilterExpression requires MongoDB 6.0+
+            self.db.jobs.create_index(
+                [("status", 1)],
+                partialFilterExpression={"status": {"$in": _ACTIVE_JOB_STATUSES}}
+            )
+        except OperationFailure as e:
+            logger.warning(f"Could not create partial index on active jobs (needs MongoDB 6.0+): {e}")
+        _indexed_databases.add(self.db_name)
+
+    def _ensure_ttl_index(self) -> None:
+        """Create the createdAt TTL index, or change its expiry in place if MONGODB_JOB_TTL_SECONDS changed"""
+        for index in self.db.jobs.list_indexes():
+            if list(index["key"].items()) == [("createdAt", 1)]:
+                if index.get("expireAfterSeconds") != _JOB_TTL_SECONDS:
+                    # create_index with new options would raise IndexOptionsConflict
+                    self.db.command(
+                        "collMod", "jobs",
+                        index={"keyPattern": {"createdAt": 1}, "expireAfterSeconds": _JOB_TTL_SECONDS}
+                    )
+                return
+        self.db.jobs.create_index("createdAt", expireAfterSeconds=_JOB_TTL_SECONDS)
     
     def create_job(self, job: Job) -> str:
-        """Create a new job and return its ID"""
-        result = self.db.jobs.insert_one(job.model_dump())
+        """Create a new job and return its ID; defaults the caller did not set are filled in on read"""
+        document = job.model_dump(mode="python", exclude_none=True, exclude_unset=True)
+        # Always stored: the TTL and active-job indexes depend on them
+        document["status"] = job.status
+        document["createdAt"] = job.createdAt
+        result = self.db.jobs.insert_one(document)
         return str(result.inserted_id)
     
     def update_job(self, job_id: str, updates: Dict[str, Any]) -> bool:
         """Update a job with new data"""
-        result = self.db.jobs.update_one(
-            {"_id": ObjectId(job_id)}, 
-            {"$set": updates}
-        )
-        return result.modified_count > 0
+        return self._update_job_fields(job_id, updates)
     
     def get_job(self, job_id: str) -> Optional[Job]:
-        """Get a job by ID"""
-        job_data = self.db.jobs.find_one({"_id": ObjectId(job_id)})
+        """Get a job by ID. Stored documents were validated on write, so they are not re-validated"""
+        job_data = self.db.jobs.find_one({"_id": _object_id(job_id)})
         if job_data:
-            return Job(**job_data)
+            if "audioChunks" in job_data:
+                job_data["audioChunks"] = [
+                    AudioChunk.model_construct(**chunk) for chunk in job_data["audioChunks"]
+                ]
+            return Job.model_construct(**job_data)
         return None
     
     def update_job_field(self, job_id: str, job: Job) -> bool:
-        """Update a job using a Job model instance"""
+        """Update a job using a Job model instance; only fields set on the instance are written"""
         result = self.db.jobs.update_one(
-            {"_id": ObjectId(job_id)}, 
-            {"$set": job.model_dump()}
+            {"_id": _object_id(job_id)}, 
+            {"$set": job.model_dump(mode="python", exclude_unset=True)}
+        )
+        return result.modified_count > 0
+    
+    def _update_job_fields(self, job_id: str, fields: Dict[str, Any], final: bool = False) -> bool:
+        write_concern = _FINAL_WRITE_CONCERN if final else _CHECKPOINT_WRITE_CONCERN
+        collection = self.db.jobs.with_options(write_concern=write_concern)
+        result = collection.update_one({"_id": _object_id(job_id)}, {"$set": fields})
+        return result.modified_count > 0
+    
+    def update_character_data(self, job_id: str, value: str) -> bool:
+        """Write only the characterData field"""
+        return self._update_job_fields(job_id, {"characterData": value})
+    
+    def update_plot(self, job_id: str, value: str) -> bool:
+        """Write only the plot field"""
+        return self._update_job_fields(job_id, {"plot": value})
+    
+    def update_story_chain(self, job_id: str, value: str) -> bool:
+        """Write only the storyChain field"""
+        return self._update_job_fields(job_id, {"storyChain": value})
+    
+    def update_story_summary(self, job_id: str, value: str) -> bool:
+        """Write only the storySummary field"""
+        return self._update_job_fields(job_id, {"storySummary": value})
+    
+    def update_first_draft(self, job_id: str, value: str) -> bool:
+        """Write only the firstDraft field"""
+        return self._update_job_fields(job_id, {"firstDraft": value})
+    
+    def update_climax_enhanced_story(self, job_id: str, value: str) -> bool:
+        """Write only the climaxEnhancedStory field"""
+        return self._update_job_fields(job_id, {"climaxEnhancedStory": value})
+    
+    def update_final_story(self, job_id: str, value: str) -> bool:
+        """Write only the finalStory field, waiting for the journal"""
+        return self._update_job_fields(job_id, {"finalStory": value}, final=True)
+    
+    def update_status(self, job_id: str, value: str) -> bool:
+        """Write only the status field"""
+        return self._update_job_fields(job_id, {"status": value})
+    
+    def update_audio_chunks(self, job_id: str, chunks: List[AudioChunk]) -> bool:
+        """Write only the audioChunks subtree"""
+        return self._update_job_fields(
+            job_id, {"audioChunks": [chunk.model_dump(mode="python") for chunk in chunks]}
         )
+    
+    def update_final_audio_file_path(self, job_id: str, value: str) -> bool:
+        """Write only the finalAudioFilePath field"""
+        return self._update_job_fields(job_id, {"finalAudioFilePath": value})
+    
+    def queue_job_update(self, job_id: str, field: str, value: Any) -> None:
+        """Queue a field update for a job; it is written by the next flush_updates call"""
+        self._pending_updates.setdefault(job_id, {})[field] = value
+    
+    def flush_updates(self, job_id: str, ops: Optional[List[UpdateOne]] = None, final: bool = False) -> bool:
+        """
+        Write the queued fields for a job as one $set, followed by any extra ops, in a single
+        round-trip. Extra ops run in order after the $set. Checkpoints are unjournaled; pass
+        final=True to wait for the journal.
+        """
+        fields = self._pending_updates.pop(job_id, {})
+        if not fields and not ops:
+            return False
+        collection = self.db.jobs.with_options(
+            write_concern=_FINAL_WRITE_CONCERN if final else _CHECKPOINT_WRITE_CONCERN
+        )
+        if not ops:
+            result = collection.update_one({"_id": _object_id(job_id)}, {"$set": fields})
+            return result.modified_count > 0
+        if fields:
+            ops = [UpdateOne({"_id": _object_id(job_id)}, {"$set": fields})] + list(ops)
+        result = collection.bulk_write(ops, ordered=True)
         return result.modified_count > 0
     
     def get_meta_data(self, story_verse: str) -> Optional[StoryverseMetaData]:
-        """Get meta data for story verse"""
+        """Get meta data for story verse, served from the process cache while fresh"""
+        cache_key = (self.db_name, story_verse)
+        cached = _meta_data_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
         meta_data = self.db.story_verse_meta_data.find_one({"storyVerse": story_verse})
         if meta_data:
-            return StoryverseMetaData(**meta_data)
+            result = StoryverseMetaData(**meta_data)
+            _meta_data_cache[cache_key] = (time.monotonic() + _META_DATA_TTL_SECONDS, result)
+            return result
+    
+    def invalidate_meta(self, story_verse: Optional[str] = None) -> None:
+        """Drop cached meta data for a story verse, or for all story verses if none is given"""
+        if story_verse is None:
+            for key in [k for k in _meta_data_cache if k[0] == self.db_name]:
+                _meta_data_cache.pop(key, None)
+        else:
+            _meta_data_cache.pop((self.db_name, story_verse), None)
     
     def close(self):
-        """Close database connection"""
-        self.client.close()
\ No newline at end of file
+        """Release this manager. The shared MongoClient stays open for other managers; see close_client"""
+        pass
\ No newline at end of file
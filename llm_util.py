@@ -1,12 +1,140 @@
 import os
+import asyncio
+import hashlib
+import random
+import sqlite3
+import threading
+import uuid
+import weakref
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional, Tuple, Union
 from dotenv import load_dotenv
 from models.api_models import PooledResponse
 import time
 
 load_dotenv()
 
+# Polling backoff: start at 0.5s, grow 1.7x per attempt, cap at 8s, give up after 450s
+_POLL_INITIAL_DELAY = 0.5
+_POLL_BACKOFF_FACTOR = 1.7
+_POLL_MAX_DELAY = 8.0
+_POLL_JITTER = 0.1
+_POLL_TIMEOUT = 450.0
+
+# Seconds the local server may hold a /responses/{id}/wait request open
+_LONG_POLL_TIMEOUT = 25
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# event loop -> (shared client, task that closes it); connections cannot be used from another loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, asyncio.Task]]" = weakref.WeakKeyDictionary()
+
+# response_id -> Future resolved by a webhook receiver via resolve_pooled_response
+_pending_responses: Dict[str, asyncio.Future] = {}
+
+
+async def _close_on_loop_shutdown(client: httpx.AsyncClient) -> None:
+    """Wait until cancelled, then close client; asyncio.run cancels leftover tasks before closing its loop"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.create_future()
+    finally:
+        entry = _async_clients.get(loop)
+        if entry is not None and entry[0] is client:
+            del _async_clients[loop]
+        await client.aclose()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Return the running event loop's shared AsyncClient, creating it on first use so keepalive
+    connections are reused across jobs. Each loop (e.g. each asyncio.run) gets its own client,
+    which is closed when that loop shuts down or close_async_client is awaited.
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None or entry[0].is_closed:
+        client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100),
+            timeout=30
+        )
+        entry = (client, loop.create_task(_close_on_loop_shutdown(client)))
+        _async_clients[loop] = entry
+    return entry[0]
+
+
+async def close_async_client() -> None:
+    """Close the running event loop's shared AsyncClient"""
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        entry[1].cancel()
+        await asyncio.gather(entry[1], return_exceptions=True)
+
+
+def _backoff_delays() -> Iterator[float]:
+    """Yield exponentially growing poll delays with a little jitter"""
+    delay = _POLL_INITIAL_DELAY
+    while True:
+        yield delay + random.random() * _POLL_JITTER
+        delay = min(delay * _POLL_BACKOFF_FACTOR, _POLL_MAX_DELAY)
+
+
+def _poll_body_ready(response: Union[requests.Response, httpx.Response]) -> bool:
+    """
+    True if a poll returned a response body to parse, False for a transient 429/5xx that
+    should be retried after the next backoff delay; raises on any other error status.
+    """
+    if response.status_code == 200:
+        return True
+    if response.status_code == 429 or response.status_code >= 500:
+        return False
+    raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+
+
+def _set_future_result(future: asyncio.Future, response: Optional[PooledResponse]) -> None:
+    if not future.done():
+        future.set_result(response)
+
+
+def resolve_pooled_response(payload: Union[dict, bytes, str]) -> bool:
+    """
+    Hand a completion delivered by a webhook to the coroutine waiting on it.
+    Safe to call from any thread.
+    
+    Args:
+        payload: Webhook body, parsed or raw JSON, in one of two forms:
+            - an OpenAI event envelope {"type": "response.completed", "data": {"id": ...}};
+              the waiter then fetches the completed response once
+            - a full PooledResponse body (id, status, output)
+    
+    Returns:
+        bool: True if a waiting getPooledResponseAsync call was resolved
+    """
+    if not isinstance(payload, dict):
+        payload = orjson.loads(payload)
+    response: Optional[PooledResponse] = None
+    if "type" in payload and isinstance(payload.get("data"), dict):
+        if payload["type"] != "response.completed":
+            return False
+        response_id = payload["data"].get("id")
+    else:
+        response = PooledResponse(**payload)
+        if response.status != "completed":
+            return False
+        response_id = response.id
+    future = _pending_responses.get(response_id)
+    if future is None or future.done():
+        return False
+    future.get_loop().call_soon_threadsafe(_set_future_result, future, response)
+    return True
+
 class LLMProvider(ABC):
     def __init__(self, baseurl: str, token: str):
         self.baseurl = baseurl
@@ -41,6 +169,27 @@ class LLMProvider(ABC):
         """
         pass
 
+    @abstractmethod
+    async def initiateResponseAsync(self, input_text: str, instructions: str = "", model: str = "gpt-4.1-nano", resoning_effort: str = "low") -> str:
+        """
+        Async variant of initiateResponse, sharing the module level AsyncClient.
+        
+        Returns:
+            str: Response ID from the provider
+        """
+        pass
+    
+    @abstractmethod
+    async def getPooledResponseAsync(self, response_id: str) -> PooledResponse:
+        """
+        Async variant of getPooledResponse. Waiting happens on the event loop,
+        so many jobs can be polled concurrently with asyncio.gather.
+        
+        Returns:
+            PooledResponse: Response data from the provider
+        """
+        pass
+
 from typing import Tuple
 
 class OpenAiLLMProvider(LLMProvider):
@@ -49,8 +198,14 @@ class OpenAiLLMProvider(LLMProvider):
             baseurl or os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
             token or os.getenv('OPENAI_API_KEY') or ""
         )
+        # Keep-alive session so polling reuses one TLS connection instead of a handshake per call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=0))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {self.token}"
     
-    def initiateResponse(self, input_text: str, instructions: str = "", model: str = "gpt-4.1-nano", resoning_effort: str = "low") -> str:
+    def _build_payload(self, input_text: str, instructions: str, model: str, resoning_effort: str) -> dict:
         payload = {
             "background": True,
             "model": model,
@@ -62,34 +217,86 @@ class OpenAiLLMProvider(LLMProvider):
 
         if "gpt-5" in model:
             payload["reasoning"] = { "effort": resoning_effort}
+        return payload
+    
+    def initiateResponse(self, input_text: str, instructions: str = "", model: str = "gpt-4.1-nano", resoning_effort: str = "low") -> str:
+        payload = self._build_payload(input_text, instructions, model, resoning_effort)
         
-        response = requests.post(
+        response = self.session.post(
             f"{self.baseurl}/responses",
-            json=payload,
-            headers={"Authorization": f"Bearer {self.token}"},
+            data=orjson.dumps(payload),
+            headers=_JSON_HEADERS,
             timeout=30
         )
         
         if response.status_code == 200:
-            result = response.json()
-            return result.get("id", "")
+            return orjson.loads(response.content).get("id", "")
         else:
             raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
     
     def getPooledResponse(self, response_id: str) -> PooledResponse:
-        isCompleted = False
-        attempts = 90
-        while isCompleted != True and attempts > 0:
-            attempts -= 1
-            response = requests.get(
+        deadline = time.monotonic() + _POLL_TIMEOUT
+        for delay in _backoff_delays():
+            response = self.session.get(
             f"{self.baseurl}/responses/{response_id}",
-            headers={"Authorization": f"Bearer {self.token}"},
             timeout=30)
-            response = PooledResponse(**response.json())
-            if response.status == "completed":
-                isCompleted = True
-                return response
-            time.sleep(5)
+            if _poll_body_ready(response):
+                response = PooledResponse.model_validate_json(response.content)
+                if response.status == "completed":
+                    return response
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+        raise Exception("OpenAI API error: Response not completed in time")
+
+    async def initiateResponseAsync(self, input_text: str, instructions: str = "", model: str = "gpt-4.1-nano", resoning_effort: str = "low") -> str:
+        payload = self._build_payload(input_text, instructions, model, resoning_effort)
+        
+        response = await get_async_client().post(
+            f"{self.baseurl}/responses",
+            content=orjson.dumps(payload),
+            headers={"Authorization": f"Bearer {self.token}", **_JSON_HEADERS}
+        )
+        
+        if response.status_code == 200:
+            return orjson.loads(response.content).get("id", "")
+        else:
+            raise Exception(f"OpenAI API error: {response.status_code} - {response.text}")
+    
+    async def getPooledResponseAsync(self, response_id: str) -> PooledResponse:
+        client = get_async_client()
+        loop = asyncio.get_running_loop()
+        # A webhook delivery resolves this future and ends the wait early
+        future = loop.create_future()
+        _pending_responses[response_id] = future
+        try:
+            deadline = loop.time() + _POLL_TIMEOUT
+            for delay in _backoff_delays():
+                response = await client.get(
+                f"{self.baseurl}/responses/{response_id}",
+                headers={"Authorization": f"Bearer {self.token}"})
+                if _poll_body_ready(response):
+                    response = PooledResponse.model_validate_json(response.content)
+                    if response.status == "completed":
+                        return response
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                if future.done():
+                    # Already notified, but the fetch did not see the completion yet
+                    await asyncio.sleep(min(delay, remaining))
+                    continue
+                try:
+                    delivered = await asyncio.wait_for(asyncio.shield(future), timeout=min(delay, remaining))
+                except asyncio.TimeoutError:
+                    continue
+                if delivered is not None:
+                    return delivered
+                # Event-only webhook: go round once more to fetch the completed response now
+        finally:
+            if _pending_responses.get(response_id) is future:
+                del _pending_responses[response_id]
         raise Exception("OpenAI API error: Response not completed in time")
 
 
@@ -98,7 +305,7 @@ class LocalLLMProvider(LLMProvider):
     def __init__(self, baseurl: str = "http://localhost:8000", token: str = ""):
         super().__init__(baseurl, token)
     
-    def initiateResponse(self, input_text: str, instructions: str = "", model: str = "local-model", resoning_effort: str = "low") -> str:
+    def _build_payload(self, input_text: str, instructions: str, model: str) -> dict:
         payload = {
             "input": input_text,
             "background": True
@@ -108,36 +315,214 @@ class LocalLLMProvider(LLMProvider):
             payload["instructions"] = instructions
         if model != "local-model":
             payload["model"] = model
-        
+        return payload
+    
+    def _headers(self) -> dict:
         headers = {}
         if self.token:
             headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+    
+    def initiateResponse(self, input_text: str, instructions: str = "", model: str = "local-model", resoning_effort: str = "low") -> str:
+        payload = self._build_payload(input_text, instructions, model)
         
         response = requests.post(
             f"{self.baseurl}/generate",
-            json=payload,
-            headers=headers,
+            data=orjson.dumps(payload),
+            headers={**self._headers(), **_JSON_HEADERS},
             timeout=30
         )
         
         if response.status_code == 200:
-            result = response.json()
-            return result.get("id", "")
+            return orjson.loads(response.content).get("id", "")
         else:
             raise Exception(f"Local API error: {response.status_code} - {response.text}")
     
     def getPooledResponse(self, response_id: str) -> PooledResponse:
-        headers = {}
-        if self.token:
-            headers["Authorization"] = f"Bearer {self.token}"
+        """
+        Long-poll GET /responses/{id}/wait?timeout=N: the server holds the request
+        until the response completes or N seconds pass, then returns its current state.
+        """
+        deadline = time.monotonic() + _POLL_TIMEOUT
+        while time.monotonic() < deadline:
+            response = requests.get(
+                f"{self.baseurl}/responses/{response_id}/wait",
+                params={"timeout": _LONG_POLL_TIMEOUT},
+                headers=self._headers(),
+                timeout=_LONG_POLL_TIMEOUT + 5
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Local API error: {response.status_code} - {response.text}")
+            response = PooledResponse.model_validate_json(response.content)
+            if response.status == "completed":
+                return response
+        raise Exception("Local API error: Response not completed in time")
+
+    async def initiateResponseAsync(self, input_text: str, instructions: str = "", model: str = "local-model", resoning_effort: str = "low") -> str:
+        payload = self._build_payload(input_text, instructions, model)
         
-        response = requests.get(
-            f"{self.baseurl}/responses/{response_id}",
-            headers=headers,
-            timeout=30
+        response = await get_async_client().post(
+            f"{self.baseurl}/generate",
+            content=orjson.dumps(payload),
+            headers={**self._headers(), **_JSON_HEADERS}
         )
         
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content).get("id", "")
         else:
             raise Exception(f"Local API error: {response.status_code} - {response.text}")
+    
+    async def getPooledResponseAsync(self, response_id: str) -> PooledResponse:
+        client = get_async_client()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + _POLL_TIMEOUT
+        while loop.time() < deadline:
+            response = await client.get(
+                f"{self.baseurl}/responses/{response_id}/wait",
+                params={"timeout": _LONG_POLL_TIMEOUT},
+                headers=self._headers(),
+                timeout=_LONG_POLL_TIMEOUT + 5
+            )
+            
+            if response.status_code != 200:
+                raise Exception(f"Local API error: {response.status_code} - {response.text}")
+            response = PooledResponse.model_validate_json(response.content)
+            if response.status == "completed":
+                return response
+        raise Exception("Local API error: Response not completed in time")
+
+
+class LLMCache(LLMProvider):
+    """
+    Wraps another LLMProvider and serves completed responses for repeated requests from a
+    SQLite cache keyed by a BLAKE2b hash of (model, reasoning effort, instructions, input).
+
+    cache_policy:
+        "use"     - return cached responses and store new ones
+        "refresh" - always call upstream, but store the new responses
+        "bypass"  - pass everything through untouched (for nondeterminism-sensitive stages)
+    """
+
+    _POLICIES = ("use", "refresh", "bypass")
+    _HIT_PREFIX = "cached-"
+    # In-flight hit/miss bookkeeping is bounded so abandoned response ids cannot pile up
+    _MAX_TRACKED = 1024
+    _TRACKED_TTL_SECONDS = 3600.0
+
+    def __init__(self, upstream: LLMProvider, db_path: str = "", ttl_seconds: int = 7 * 86400, cache_policy: str = "use"):
+        super().__init__(upstream.baseurl, upstream.token)
+        if cache_policy not in self._POLICIES:
+            raise ValueError(f"Unknown cache_policy '{cache_policy}', expected one of {self._POLICIES}")
+        self.upstream = upstream
+        self.cache_policy = cache_policy
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path or os.getenv('LLM_CACHE_PATH', '.llm_cache.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, response BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+        # Synthetic response id -> (tracked at, cached response), for hits awaiting getPooledResponse
+        self._hits: "OrderedDict[str, Tuple[float, PooledResponse]]" = OrderedDict()
+        # Upstream response id -> (tracked at, cache key), for misses whose result should be stored
+        self._misses: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    @staticmethod
+    def _cache_key(input_text: str, instructions: str, model: str, resoning_effort: str) -> str:
+        material = "\x00".join([model, resoning_effort, instructions, input_text])
+        return hashlib.blake2b(material.encode("utf-8"), digest_size=32).hexdigest()
+
+    def _track(self, table: OrderedDict, response_id: str, value) -> None:
+        """Add an entry, dropping expired ones and then the oldest beyond _MAX_TRACKED"""
+        now = time.monotonic()
+        with self._lock:
+            table[response_id] = (now, value)
+            while table:
+                tracked_at, _ = next(iter(table.values()))
+                if len(table) <= self._MAX_TRACKED and now - tracked_at < self._TRACKED_TTL_SECONDS:
+                    break
+                table.popitem(last=False)
+
+    def _untrack(self, table: OrderedDict, response_id: str):
+        with self._lock:
+            entry = table.pop(response_id, None)
+        return None if entry is None else entry[1]
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Return a synthetic response id if the key is cached and reads are enabled"""
+        if self.cache_policy != "use":
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        # Unique per hit, so concurrent duplicate requests each get their own id
+        response_id = f"{self._HIT_PREFIX}{key}-{uuid.uuid4().hex}"
+        self._track(self._hits, response_id, PooledResponse.model_validate_json(row[0]))
+        return response_id
+
+    def _take_hit(self, response_id: str) -> Optional[PooledResponse]:
+        """Return the cached response for a synthetic id, or None for an upstream id"""
+        if not response_id.startswith(self._HIT_PREFIX):
+            return None
+        response = self._untrack(self._hits, response_id)
+        if response is None:
+            # Synthetic ids mean nothing upstream, so never forward them
+            raise ValueError(f"Cached response {response_id} was already read or has expired")
+        return response
+
+    def _track_miss(self, response_id: str, key: str) -> None:
+        if self.cache_policy != "bypass":
+            self._track(self._misses, response_id, key)
+
+    def _store(self, response_id: str, response: PooledResponse) -> None:
+        key = self._untrack(self._misses, response_id)
+        if key is None:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, response.model_dump_json(), time.time() + self.ttl_seconds)
+            )
+
+    def initiateResponse(self, input_text: str, instructions: str = "", model: str = "gpt-4.1-nano", resoning_effort: str = "low") -> str:
+        key = self._cache_key(input_text, instructions, model, resoning_effort)
+        cached_id = self._lookup(key)
+        if cached_id:
+            return cached_id
+        response_id = self.upstream.initiateResponse(input_text, instructions, model, resoning_effort)
+        self._track_miss(response_id, key)
+        return response_id
+
+    def getPooledResponse(self, response_id: str) -> PooledResponse:
+        cached = self._take_hit(response_id)
+        if cached is not None:
+            return cached
+        response = self.upstream.getPooledResponse(response_id)
+        self._store(response_id, response)
+        return response
+
+    async def initiateResponseAsync(self, input_text: str, instructions: str = "", model: str = "gpt-4.1-nano", resoning_effort: str = "low") -> str:
+        key = self._cache_key(input_text, instructions, model, resoning_effort)
+        cached_id = self._lookup(key)
+        if cached_id:
+            return cached_id
+        response_id = await self.upstream.initiateResponseAsync(input_text, instructions, model, resoning_effort)
+        self._track_miss(response_id, key)
+        return response_id
+
+    async def getPooledResponseAsync(self, response_id: str) -> PooledResponse:
+        cached = self._take_hit(response_id)
+        if cached is not None:
+            return cached
+        response = await self.upstream.getPooledResponseAsync(response_id)
+        self._store(response_id, response)
+        return response
+
+    def close(self) -> None:
+        """Close the cache database"""
+        self._conn.close()
@@ -1,19 +1,48 @@
-from pydantic import BaseModel
+from datetime import datetime, timezone
+from itertools import accumulate
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, model_validator
+
+# Storyverse metadata is read-only once loaded and shared through the metadata cache
+_READ_ONLY_CONFIG = ConfigDict(extra="ignore", frozen=True, validate_assignment=False)
 
 class ParameterValueDistribution(BaseModel):
+    model_config = _READ_ONLY_CONFIG
     value: str
     probability: float
 class PromptParameterDetails(BaseModel):
+     model_config = _READ_ONLY_CONFIG
      key : str
      valueDistribution: list[ParameterValueDistribution]
      chooseMultiple: bool = False
+     # Normalized once at load time and read by prompt_utils on every prompt
+     _values: list[str] = PrivateAttr(default_factory=list)
+     _probs: list[float] = PrivateAttr(default_factory=list)
+     _cum_probs: list[float] = PrivateAttr(default_factory=list)
+     _bernoulli: list[tuple[str, float]] = PrivateAttr(default_factory=list)
+
+     @model_validator(mode="after")
+     def _normalize_distribution(self) -> "PromptParameterDetails":
+          """Normalize probabilities (uniform if all are zero) and clamp chooseMultiple probabilities to 1"""
+          probs = [max(d.probability, 0.0) for d in self.valueDistribution]
+          total = sum(probs)
+          if total <= 0:
+               probs = [1.0 / len(probs)] * len(probs) if probs else []
+          else:
+               probs = [p / total for p in probs]
+          self._values = [d.value for d in self.valueDistribution]
+          self._probs = probs
+          self._cum_probs = list(accumulate(probs))
+          self._bernoulli = [(d.value, min(d.probability, 1.0)) for d in self.valueDistribution if d.probability > 0]
+          return self
      
 class BasePromptTemplateV2(BaseModel):
+        model_config = _READ_ONLY_CONFIG
         promptTemplate: str
         parameterKys: list[str]
         promptParameterDetailsList: list[PromptParameterDetails]
 
 class BasePromptTemplate(BaseModel):
+        model_config = _READ_ONLY_CONFIG
         promptTemplate: str
         parameterKys: list[str]
 
@@ -22,6 +51,7 @@ class CrimeThemeDetails(BaseModel):
      probability: float
 
 class StoryverseMetaData(BaseModel):
+    model_config = _READ_ONLY_CONFIG
     storyVerse: str
     characterGenearationPromptTemplate: BasePromptTemplateV2
     plotGenerationPromptTemplate: BasePromptTemplateV2
@@ -38,6 +68,7 @@ class AudioChunk(BaseModel):
 
 
 class Job(BaseModel):
+    model_config = ConfigDict(extra="ignore", validate_assignment=False)
     storyVerse : str
     characterData: str
     plot: str
@@ -47,4 +78,8 @@ class Job(BaseModel):
     climaxEnhancedStory: str
     finalStory: str
     audioChunks: list[AudioChunk] = []
-    finalAudioFilePath: str = ""
\ No newline at end of file
+    finalAudioFilePath: str = ""
+    # "pending" | "running" | "completed"
+    status: str = "pending"
+    # Jobs expire via a TTL index on this field (see DatabaseManager)
+    createdAt: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+pipeline_util.py
+
+Provides run_pipeline(...) which runs a DAG of async stages, starting every stage as soon as
+all of its dependencies have finished. Independent stages (and independent jobs) therefore
+overlap their LLM round-trips instead of waiting on each other. run_pipelines(...) runs
+several such pipelines (e.g. one per job) concurrently.
+
+Each stage receives a dict of its dependencies' results:
+
+    stages = {
+        "characterData": PipelineStage(run=gen_characters),
+        "plot": PipelineStage(run=gen_plot, deps=["characterData"]),
+    }
+    results = await run_pipeline(stages)
+"""
+
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Union
+
+from llm_util import LLMProvider
+from models.api_models import PooledResponse
+
+
+@dataclass
+class PipelineStage:
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+    deps: List[str] = field(default_factory=list)
+
+
+async def generate_response_async(
+    llm_provider: LLMProvider,
+    prompt: str,
+    instructions: str = "",
+    model: str = "gpt-4.1-nano",
+    resoning_effort: str = "low",
+) -> PooledResponse:
+    """Submit a prompt and wait for its completed response without blocking the event loop"""
+    response_id = await llm_provider.initiateResponseAsync(
+        prompt, instructions=instructions, model=model, resoning_effort=resoning_effort
+    )
+    return await llm_provider.getPooledResponseAsync(response_id)
+
+
+async def run_pipeline(stages: Dict[str, PipelineStage]) -> Dict[str, Any]:
+    """
+    Run stages concurrently in dependency order.
+
+    Args:
+        stages: stage name -> PipelineStage
+
+    Returns:
+        Dict[str, Any]: stage name -> result of that stage
+
+    Raises:
+        ValueError: if a stage depends on an unknown stage or the dependencies form a cycle
+        Exception: an exception raised by a stage; stages still running are cancelled
+    """
+    for name, stage in stages.items():
+        missing = [d for d in stage.deps if d not in stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {missing}")
+
+    results: Dict[str, Any] = {}
+    pending = dict(stages)
+    running: Dict[asyncio.Task, str] = {}
+
+    try:
+        while pending or running:
+            ready = [name for name, stage in pending.items() if all(d in results for d in stage.deps)]
+            for name in ready:
+                stage = pending.pop(name)
+                task = asyncio.ensure_future(stage.run({d: results[d] for d in stage.deps}))
+                running[task] = name
+
+            if not running:
+                raise ValueError(f"Dependency cycle between stages: {sorted(pending)}")
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            error = None
+            for task in done:
+                name = running.pop(task)
+                # Retrieve every exception so none is reported as never retrieved
+                exc = task.exception()
+                if exc is not None:
+                    error = error or exc
+                else:
+                    results[name] = task.result()
+            if error is not None:
+                raise error
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return results
+
+
+async def run_pipelines(pipelines: List[Dict[str, PipelineStage]]) -> List[Union[Dict[str, Any], BaseException]]:
+    """
+    Run independent pipelines (e.g. one per job) concurrently, so their LLM round-trips overlap.
+
+    Returns:
+        List[Union[Dict[str, Any], BaseException]]: results of each pipeline, or the exception
+        that stopped it, in input order; a failing pipeline does not stop the others
+    """
+    return await asyncio.gather(*[run_pipeline(p) for p in pipelines], return_exceptions=True)
+
+
+# Demo / self-test when run as a script
+if __name__ == "__main__":
+    import time
+
+    def _stage(name: str, seconds: float):
+        async def run(deps: Dict[str, Any]) -> str:
+            await asyncio.sleep(seconds)
+            return f"{name}({', '.join(deps.values())})"
+        return run
+
+    demo = {
+        "characters": PipelineStage(run=_stage("characters", 0.2)),
+        "setting": PipelineStage(run=_stage("setting", 0.2)),
+        "plot": PipelineStage(run=_stage("plot", 0.2), deps=["characters", "setting"]),
+        "summary": PipelineStage(run=_stage("summary", 0.2), deps=["plot"]),
+        "title": PipelineStage(run=_stage("title", 0.2), deps=["plot"]),
+    }
+
+    start = time.monotonic()
+    out = asyncio.run(run_pipeline(demo))
+    print(f"Finished in {time.monotonic() - start:.2f}s (3 levels of 0.2s stages)")
+    for name, result in out.items():
+        print(f"  {name}: {result}")
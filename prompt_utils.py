@@ -13,17 +13,63 @@ This version imports the Pydantic models directly from models/db_models.py:
 from __future__ import annotations
 import re
 import random
-from typing import Any, Dict, List, Optional, Union
+import bisect
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    # DFA-based matching, no backtracking; same API as re for what is used here
+    import re2 as _regex
+except ImportError:
+    _regex = re
 
 # Import the models directly as requested
 from models.db_models import (
     ParameterValueDistribution,
     PromptParameterDetails,
     BasePromptTemplate,
+    BasePromptTemplateV2,
 )
 
 
-_PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*([a-zA-Z0-9_.-]+)\s*\}\}")
+_PLACEHOLDER_PATTERN = _regex.compile(r"\{\{\s*([a-zA-Z0-9_.-]+)\s*\}\}")
+
+_COMPILED_CACHE_SIZE = 128
+
+
+@dataclass
+class CompiledParameter:
+    """Pre-normalized value distribution for one parameter key"""
+    values: List[str]
+    probs: List[float]
+    cum_probs: List[float]
+    # chooseMultiple: (value, probability) pairs with probability > 0, clamped to 1
+    bernoulli: List[Tuple[str, float]]
+    choose_multiple: bool = False
+
+
+@dataclass
+class CompiledTemplate:
+    """
+    A template split once into literal text and placeholder slots.
+    segments holds literal strings, or ints indexing into keys.
+    parameters is None for keys that had no valueDistribution.
+    """
+    segments: List[Union[str, int]]
+    keys: List[str]
+    parameters: Dict[str, Optional[CompiledParameter]]
+    warnings: List[str] = field(default_factory=list)
+
+
+# Frozen models are memoized by identity and held so their id cannot be reused;
+# dicts and duck-typed inputs can change in place, so they are keyed on their content
+_FROZEN_TEMPLATE_TYPES = (BasePromptTemplate, BasePromptTemplateV2)
+_compiled_cache: "OrderedDict[Hashable, Tuple[Any, CompiledTemplate]]" = OrderedDict()
 
 
 def _normalize_probabilities(distributions: List[Dict[str, Any]]) -> List[float]:
@@ -46,21 +92,11 @@ def _normalize_probabilities(distributions: List[Dict[str, Any]]) -> List[float]
     return [p / total for p in probs]
 
 
-def _pick_one_value(distributions: List[Dict[str, Any]]) -> str:
-    """Normalize probabilities and pick one value using random.choices"""
-    if not distributions:
-        return ""
-    values = [str(d.get("value", "")) for d in distributions]
-    probs = _normalize_probabilities(distributions)
-    picked = random.choices(values, weights=probs, k=1)[0]
-    return picked
-
-
-def _pick_multiple_values(distributions: List[Dict[str, Any]]) -> List[str]:
-    """For chooseMultiple == True: do independent Bernoulli trials for each distribution entry.
-       Probability is clamped to [0,1]. If probability > 1 treat as 1.
+def _bernoulli_probabilities(distributions: List[Dict[str, Any]]) -> List[Tuple[str, float]]:
+    """Return (value, probability) pairs for chooseMultiple, dropping entries with probability <= 0
+       and clamping probability > 1 to 1.
     """
-    results: List[str] = []
+    pairs: List[Tuple[str, float]] = []
     for d in distributions:
         value = str(d.get("value", ""))
         try:
@@ -69,10 +105,23 @@ def _pick_multiple_values(distributions: List[Dict[str, Any]]) -> List[str]:
             p = 0.0
         if p <= 0.0:
             continue
-        if p >= 1.0:
-            results.append(value)
-            continue
-        if random.random() < p:
+        pairs.append((value, min(p, 1.0)))
+    return pairs
+
+
+def _pick_one_value(param: CompiledParameter, rng: Union[random.Random, Any] = random) -> str:
+    """Pick one value by bisecting the cumulative probabilities"""
+    if not param.values:
+        return ""
+    idx = bisect.bisect(param.cum_probs, rng.random())
+    return param.values[min(idx, len(param.values) - 1)]
+
+
+def _pick_multiple_values(param: CompiledParameter, rng: Union[random.Random, Any] = random) -> List[str]:
+    """For chooseMultiple == True: do independent Bernoulli trials for each distribution entry."""
+    results: List[str] = []
+    for value, p in param.bernoulli:
+        if p >= 1.0 or rng.random() < p:
             results.append(value)
     return results
 
@@ -121,32 +170,44 @@ def _extract_template_and_params(
     return template_str, list(param_list or [])
 
 
-def getPromptFromTemplate(
-    template_input: Union[BasePromptTemplate, Dict[str, Any], Any],
-    seed: Optional[int] = None,
-) -> Dict[str, Any]:
-    """
-    Process a BasePromptTemplate-like object/dict and return chosen parameter values and the prompt.
+def _compile_parameter(details: Any) -> Optional[CompiledParameter]:
+    """Extract and pre-normalize valueDistribution and chooseMultiple (supports dicts, models, or duck-typed)"""
+    if isinstance(details, PromptParameterDetails):
+        # Already normalized when the model was validated
+        if not details.valueDistribution:
+            return None
+        return CompiledParameter(
+            values=details._values,
+            probs=details._probs,
+            cum_probs=details._cum_probs,
+            bernoulli=details._bernoulli,
+            choose_multiple=bool(details.chooseMultiple),
+        )
+
+    if isinstance(details, dict):
+        raw_vdist = details.get("valueDistribution", []) or []
+        choose_multiple = bool(details.get("chooseMultiple", False))
+    else:
+        raw_vdist = getattr(details, "valueDistribution", []) or []
+        choose_multiple = bool(getattr(details, "chooseMultiple", False))
 
-    Args:
-        template_input: BasePromptTemplate instance or dict/object with:
-            - promptTemplate: str
-            - promptParameterDetailsList: list of PromptParameterDetails-like items
-        seed: Optional[int] to seed randomness for reproducibility.
+    norm_vdist = _normalize_vdist_items(list(raw_vdist))
+    if not norm_vdist:
+        return None
+
+    probs = _normalize_probabilities(norm_vdist)
+    return CompiledParameter(
+        values=[str(d.get("value", "")) for d in norm_vdist],
+        probs=probs,
+        cum_probs=list(accumulate(probs)),
+        bernoulli=_bernoulli_probabilities(norm_vdist),
+        choose_multiple=choose_multiple,
+    )
 
-    Returns:
-        {
-          "prompt": "<filled prompt string>",
-          "selections": { "<key>": ["val1", "val2", ...], ... },
-          "warnings": [ ... ]
-        }
-    """
-    if seed is not None:
-        random.seed(seed)
 
+def _compile_template(template_input: Union[BasePromptTemplate, Dict[str, Any], Any]) -> CompiledTemplate:
     template_str, param_details_list = _extract_template_and_params(template_input)
     warnings: List[str] = []
-    selections: Dict[str, List[str]] = {}
 
     # Build a map key -> details
     key_to_details: Dict[str, Any] = {}
@@ -167,48 +228,179 @@ def getPromptFromTemplate(
                 continue
             key_to_details[str(key)] = p
 
-    # For every parameter detail compute selection(s)
+    parameters: Dict[str, Optional[CompiledParameter]] = {}
     for key, details in key_to_details.items():
-        # Extract valueDistribution and chooseMultiple (support dicts, models, or duck-typed)
-        if isinstance(details, dict):
-            raw_vdist = details.get("valueDistribution", []) or []
-            choose_multiple = bool(details.get("chooseMultiple", False))
-        elif isinstance(details, PromptParameterDetails):
-            raw_vdist = details.valueDistribution or []
-            choose_multiple = bool(details.chooseMultiple)
+        parameters[key] = _compile_parameter(details)
+        if parameters[key] is None:
+            warnings.append(f"No valueDistribution provided for parameter '{key}'.")
+
+    # Split the template into literal text and placeholder slots
+    segments: List[Union[str, int]] = []
+    keys: List[str] = []
+    key_index: Dict[str, int] = {}
+    pos = 0
+    for match in _PLACEHOLDER_PATTERN.finditer(template_str):
+        if match.start() > pos:
+            segments.append(template_str[pos:match.start()])
+        k = match.group(1)
+        if k in parameters:
+            if k not in key_index:
+                key_index[k] = len(keys)
+                keys.append(k)
+            segments.append(key_index[k])
         else:
-            raw_vdist = getattr(details, "valueDistribution", []) or []
-            choose_multiple = bool(getattr(details, "chooseMultiple", False))
+            warnings.append(f"Template contains placeholder '{{{{{k}}}}}' but no parameter details were provided.")
+            segments.append(match.group(0))  # Keep the original placeholder unchanged
+        pos = match.end()
+    if pos < len(template_str):
+        segments.append(template_str[pos:])
 
-        norm_vdist = _normalize_vdist_items(list(raw_vdist))
+    return CompiledTemplate(segments=segments, keys=keys, parameters=parameters, warnings=warnings)
 
-        if not norm_vdist:
-            warnings.append(f"No valueDistribution provided for parameter '{key}'.")
-            selections[key] = []
-            continue
 
-        if not choose_multiple:
-            chosen = _pick_one_value(norm_vdist)
+def _parameter_content_key(details: Any) -> Hashable:
+    if isinstance(details, dict):
+        key = details.get("key")
+        raw_vdist = details.get("valueDistribution", []) or []
+        choose_multiple = details.get("chooseMultiple", False)
+    else:
+        key = getattr(details, "key", None)
+        raw_vdist = getattr(details, "valueDistribution", []) or []
+        choose_multiple = getattr(details, "chooseMultiple", False)
+    vdist = tuple(
+        (str(d.get("value", "")), repr(d.get("probability", 0.0)))
+        for d in _normalize_vdist_items(list(raw_vdist))
+    )
+    return (str(key) if key else None, bool(choose_multiple), vdist)
+
+
+def _template_cache_key(template_input: Union[BasePromptTemplate, Dict[str, Any], Any]) -> Hashable:
+    if isinstance(template_input, _FROZEN_TEMPLATE_TYPES):
+        return ("id", id(template_input))
+    template_str, param_details_list = _extract_template_and_params(template_input)
+    return ("content", template_str, tuple(_parameter_content_key(p) for p in param_details_list))
+
+
+def compileTemplate(template_input: Union[BasePromptTemplate, Dict[str, Any], Any]) -> CompiledTemplate:
+    """
+    Return the CompiledTemplate for a template, compiling it on first use.
+    Frozen template models are memoized by identity; dicts and duck-typed
+    inputs by their current content, so in-place edits are picked up.
+    """
+    cache_key = _template_cache_key(template_input)
+    frozen = cache_key[0] == "id"
+    cached = _compiled_cache.get(cache_key)
+    if cached is not None and (not frozen or cached[0] is template_input):
+        _compiled_cache.move_to_end(cache_key)
+        return cached[1]
+
+    compiled = _compile_template(template_input)
+    _compiled_cache[cache_key] = (template_input if frozen else None, compiled)
+    if len(_compiled_cache) > _COMPILED_CACHE_SIZE:
+        _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def getPromptFromTemplate(
+    template_input: Union[BasePromptTemplate, Dict[str, Any], Any],
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Process a BasePromptTemplate-like object/dict and return chosen parameter values and the prompt.
+
+    Args:
+        template_input: BasePromptTemplate instance or dict/object with:
+            - promptTemplate: str
+            - promptParameterDetailsList: list of PromptParameterDetails-like items
+        seed: Optional[int] to seed a private random.Random for reproducibility;
+            the global random state is left untouched.
+
+    Returns:
+        {
+          "prompt": "<filled prompt string>",
+          "selections": { "<key>": ["val1", "val2", ...], ... },
+          "warnings": [ ... ]
+        }
+    """
+    rng = random.Random(seed) if seed is not None else random
+
+    compiled = compileTemplate(template_input)
+    selections: Dict[str, List[str]] = {}
+
+    # For every parameter detail compute selection(s)
+    for key, param in compiled.parameters.items():
+        if param is None:
+            selections[key] = []
+        elif not param.choose_multiple:
+            chosen = _pick_one_value(param, rng)
             selections[key] = [chosen] if chosen != "" else []
         else:
-            chosen_list = _pick_multiple_values(norm_vdist)
-            selections[key] = chosen_list
+            selections[key] = _pick_multiple_values(param, rng)
 
-    # Replace placeholders in template
-    def _replacement(match: re.Match) -> str:
-        k = match.group(1)
-        if k in selections:
-            vals = selections[k]
-            if not vals:
-                return ""
-            return ", ".join(vals)
-        else:
-            warnings.append(f"Template contains placeholder '{{{{{k}}}}}' but no parameter details were provided.")
-            return match.group(0)  # Return the original placeholder unchanged
+    return {
+        "prompt": _fill_segments(compiled, selections),
+        "selections": selections,
+        "warnings": list(compiled.warnings),
+    }
 
-    filled_prompt = _PLACEHOLDER_PATTERN.sub(_replacement, template_str)
 
-    return {"prompt": filled_prompt, "selections": selections, "warnings": warnings}
+def _fill_segments(compiled: CompiledTemplate, selections: Dict[str, List[str]]) -> str:
+    """Join literal segments with the selected values for each placeholder slot"""
+    filled_values = [", ".join(selections[k]) for k in compiled.keys]
+    return "".join(
+        seg if isinstance(seg, str) else filled_values[seg] for seg in compiled.segments
+    )
+
+
+def getPromptsFromTemplateBatch(
+    template_input: Union[BasePromptTemplate, Dict[str, Any], Any],
+    n: int,
+    rng: Optional[np.random.Generator] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate n prompts from one template, sampling each parameter for the whole batch
+    with a single vectorized NumPy call instead of one random draw per prompt.
+
+    Args:
+        template_input: Same as getPromptFromTemplate
+        n: Number of prompts to generate
+        rng: Optional numpy Generator for reproducibility (defaults to np.random.default_rng())
+
+    Returns:
+        List of n dicts shaped like the result of getPromptFromTemplate.
+    """
+    # Only batch sampling needs NumPy, so single prompts work without it installed
+    import numpy as np
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    compiled = compileTemplate(template_input)
+    per_key: Dict[str, List[List[str]]] = {}
+
+    for key, param in compiled.parameters.items():
+        if param is None:
+            per_key[key] = [[] for _ in range(n)]
+        elif not param.choose_multiple:
+            picks = rng.choice(len(param.values), size=n, p=np.asarray(param.probs))
+            per_key[key] = [[param.values[i]] if param.values[i] != "" else [] for i in picks.tolist()]
+        elif not param.bernoulli:
+            per_key[key] = [[] for _ in range(n)]
+        else:
+            values = [value for value, _ in param.bernoulli]
+            probs = np.asarray([p for _, p in param.bernoulli])
+            mask = rng.random((n, len(values))) < probs
+            per_key[key] = [[v for v, hit in zip(values, row) if hit] for row in mask.tolist()]
+
+    results: List[Dict[str, Any]] = []
+    for i in range(n):
+        selections = {key: picks[i] for key, picks in per_key.items()}
+        results.append({
+            "prompt": _fill_segments(compiled, selections),
+            "selections": selections,
+            "warnings": list(compiled.warnings),
+        })
+    return results
 
 
 # Demo / self-test when run as a script
@@ -250,3 +442,9 @@ if __name__ == "__main__":
     print("Filled prompt:\n", out["prompt"])
     print("Selections:", out["selections"])
     print("Warnings:", out["warnings"])
+
+    import numpy as np
+
+    print("Batch run of 3 with numpy seed=42")
+    for out in getPromptsFromTemplateBatch(demo, 3, np.random.default_rng(42)):
+        print(" ", out["prompt"])
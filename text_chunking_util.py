@@ -40,8 +40,5 @@ class SimpleTextChunkCreator(TextChunkCreator):
         if not separator:
             return [text]
 
-        # Split by separator and filter out empty strings
-        chunks = [chunk.strip() for chunk in text.split(separator) if chunk.strip()]
-        chunks = [chunk for chunk in chunks if chunk]  # filter out empty strings
-
-        return chunks
\ No newline at end of file
+        # Split by separator, strip each piece once and drop empty ones
+        return [chunk for chunk in (piece.strip() for piece in text.split(separator)) if chunk]
\ No newline at end of file
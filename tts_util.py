@@ -1,13 +1,50 @@
 import os
 import time
+import asyncio
+import tempfile
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from abc import ABC, abstractmethod
-from typing import Optional
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Mapping, Optional, Tuple, Union
 from dotenv import load_dotenv
 import logging
+from llm_util import get_async_client
+from models.db_models import AudioChunk
 
 load_dotenv()
 
+# Bytes read from the TTS response per write, so a whole WAV is never held in memory
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Concurrent TTS requests in generate_all
+_DEFAULT_TTS_CONCURRENCY = 16
+
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# Speech can take minutes before and between bytes, so only the read timeout is generous;
+# connect/pool stay short so a stalled request cannot hold a concurrency slot forever
+_TTS_TIMEOUT = httpx.Timeout(connect=10.0, read=300.0, write=30.0, pool=30.0)
+
+
+def _retry_after_seconds(headers: Mapping[str, str], default: float) -> float:
+    """Seconds to wait according to a Retry-After header (delta-seconds or HTTP date), else default"""
+    value = headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
 class TTSProvider(ABC):
     """Abstract base class for TTS providers"""
 
@@ -30,6 +67,46 @@ class TTSProvider(ABC):
         """
         pass
 
+    @abstractmethod
+    async def generate_speech_async(self, voice: str, instructions: str, input_text: str,
+                                    folder: str, chunk_index: int, chunk_id: str) -> str:
+        """
+        Async variant of generate_speech
+
+        Returns:
+            str: Path to the generated audio file
+        """
+        pass
+
+    async def generate_all(self, chunks: List[Tuple[int, AudioChunk]], voice: str, instructions: str,
+                           folder: str, max_concurrency: int = _DEFAULT_TTS_CONCURRENCY
+                           ) -> List[Union[str, BaseException]]:
+        """
+        Generate speech for many chunks concurrently, with at most max_concurrency requests in flight
+
+        Args:
+            chunks: (chunk_index, AudioChunk) pairs
+            voice: Voice to use for every chunk
+            instructions: Voice instructions/tone
+            folder: Output folder path
+            max_concurrency: Maximum number of simultaneous TTS requests
+
+        Returns:
+            List[Union[str, BaseException]]: File path, or the exception raised, for each chunk in order
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _bounded(chunk_index: int, chunk: AudioChunk) -> str:
+            async with semaphore:
+                return await self.generate_speech_async(
+                    voice, instructions, chunk.text, folder, chunk_index, chunk.chunkId
+                )
+
+        return await asyncio.gather(
+            *[_bounded(chunk_index, chunk) for chunk_index, chunk in chunks],
+            return_exceptions=True
+        )
+
 
 class OpenAiTTSProvider(TTSProvider):
     """OpenAI TTS provider implementation"""
@@ -43,6 +120,13 @@ class OpenAiTTSProvider(TTSProvider):
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
 
+        # Keep-alive session shared by all chunks; retries are handled in generate_speech
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=0))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
         # Setup logging
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
@@ -55,16 +139,8 @@ class OpenAiTTSProvider(TTSProvider):
         """Generate standardized filename"""
         return f"{chunk_index:03d}_{chunk_id}.wav"
 
-    def _make_tts_request(self, voice: str, instructions: str, input_text: str) -> requests.Response:
-        """Make TTS API request to OpenAI"""
-        url = f"{self.base_url}/audio/speech"
-
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {self.api_key}'
-        }
-
-        data = {
+    def _tts_payload(self, voice: str, instructions: str, input_text: str) -> dict:
+        return {
             "model": "gpt-4o-mini-tts",
             "voice": voice,
             "instructions": instructions,
@@ -72,20 +148,51 @@ class OpenAiTTSProvider(TTSProvider):
             "response_format": "wav"
         }
 
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
+    def _make_tts_request(self, voice: str, instructions: str, input_text: str) -> requests.Response:
+        """Make TTS API request to OpenAI"""
+        url = f"{self.base_url}/audio/speech"
+        data = self._tts_payload(voice, instructions, input_text)
+
+        response = self.session.post(url, data=orjson.dumps(data), headers=_JSON_HEADERS, stream=True)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
         return response
 
-    def _standardize_audio_format(self, audio_data: bytes) -> bytes:
+    def _write_audio_file(self, response: requests.Response, file_path: str) -> None:
         """
-        Standardize audio format (placeholder for future audio processing)
-        Currently returns audio as-is, but can be extended for:
-        - Sample rate normalization
-        - Volume normalization
-        - Format conversion
+        Stream the response body to a temporary file next to file_path, then move it
+        into place so a partially written file is never visible under the final name.
+        Any post-processing (normalization, format conversion) runs as a separate pass
+        over the finished file.
         """
-        # TODO: Add audio processing with libraries like pydub if needed
-        return audio_data
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(file_path) or '.',
+                                         suffix='.part', delete=False) as f:
+            tmp_path = f.name
+            try:
+                for chunk in response.iter_content(chunk_size=_STREAM_CHUNK_SIZE):
+                    f.write(chunk)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, file_path)
+
+    async def _write_audio_file_async(self, response: httpx.Response, file_path: str) -> None:
+        """Async counterpart of _write_audio_file"""
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(file_path) or '.',
+                                         suffix='.part', delete=False) as f:
+            tmp_path = f.name
+            try:
+                async for chunk in response.aiter_bytes(chunk_size=_STREAM_CHUNK_SIZE):
+                    f.write(chunk)
+            except BaseException:
+                f.close()
+                os.remove(tmp_path)
+                raise
+        os.replace(tmp_path, file_path)
 
     def generate_speech(self, voice: str, instructions: str, input_text: str,
                        folder: str, chunk_index: int, chunk_id: str) -> str:
@@ -105,15 +212,9 @@ class OpenAiTTSProvider(TTSProvider):
             try:
                 self.logger.info(f"Generating audio for chunk {chunk_index}_{chunk_id}, attempt {attempt + 1}")
 
-                # Make API request
-                response = self._make_tts_request(voice, instructions, input_text)
-
-                # Standardize audio format
-                audio_data = self._standardize_audio_format(response.content)
-
-                # Save to filesystem
-                with open(file_path, 'wb') as f:
-                    f.write(audio_data)
+                # Make API request and stream the audio to the filesystem
+                with self._make_tts_request(voice, instructions, input_text) as response:
+                    self._write_audio_file(response, file_path)
 
                 self.logger.info(f"Successfully generated audio: {file_path}")
                 return file_path
@@ -121,7 +222,7 @@ class OpenAiTTSProvider(TTSProvider):
             except requests.exceptions.HTTPError as e:
                 last_exception = e
                 if e.response.status_code == 429:  # Rate limit
-                    wait_time = self.retry_delay * (2 ** attempt)
+                    wait_time = _retry_after_seconds(e.response.headers, self.retry_delay * (2 ** attempt))
                     self.logger.warning(f"Rate limit hit for chunk {chunk_id}, waiting {wait_time}s")
                     time.sleep(wait_time)
                 elif e.response.status_code >= 500:  # Server error
@@ -148,5 +249,70 @@ class OpenAiTTSProvider(TTSProvider):
         if last_exception:
             error_msg += f": {str(last_exception)}"
 
+        self.logger.error(error_msg)
+        raise Exception(error_msg)
+
+    async def generate_speech_async(self, voice: str, instructions: str, input_text: str,
+                                    folder: str, chunk_index: int, chunk_id: str) -> str:
+        """
+        Generate speech using OpenAI TTS API over the shared httpx AsyncClient, with retry logic.
+        Rate limits honor the server's Retry-After header.
+
+        Returns:
+            str: Path to the generated audio file
+        """
+        self._create_output_directory(folder)
+        filename = self._generate_filename(chunk_index, chunk_id)
+        file_path = os.path.join(folder, filename)
+        url = f"{self.base_url}/audio/speech"
+        body = orjson.dumps(self._tts_payload(voice, instructions, input_text))
+        headers = {'Authorization': f'Bearer {self.api_key}', **_JSON_HEADERS}
+
+        last_exception = None
+
+        for attempt in range(self.max_retries):
+            try:
+                self.logger.info(f"Generating audio for chunk {chunk_index}_{chunk_id}, attempt {attempt + 1}")
+
+                async with get_async_client().stream('POST', url, content=body, headers=headers,
+                                                     timeout=_TTS_TIMEOUT) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                    response.raise_for_status()
+                    await self._write_audio_file_async(response, file_path)
+
+                self.logger.info(f"Successfully generated audio: {file_path}")
+                return file_path
+
+            except httpx.HTTPStatusError as e:
+                last_exception = e
+                if e.response.status_code == 429:  # Rate limit
+                    wait_time = _retry_after_seconds(e.response.headers, self.retry_delay * (2 ** attempt))
+                    self.logger.warning(f"Rate limit hit for chunk {chunk_id}, waiting {wait_time}s")
+                    await asyncio.sleep(wait_time)
+                elif e.response.status_code >= 500:  # Server error
+                    wait_time = self.retry_delay * (2 ** attempt)
+                    self.logger.warning(f"Server error for chunk {chunk_id}, waiting {wait_time}s")
+                    await asyncio.sleep(wait_time)
+                else:
+                    self.logger.error(f"HTTP error for chunk {chunk_id}: {e}")
+                    break
+
+            except httpx.RequestError as e:
+                last_exception = e
+                wait_time = self.retry_delay * (2 ** attempt)
+                self.logger.warning(f"Request error for chunk {chunk_id}, waiting {wait_time}s: {e}")
+                await asyncio.sleep(wait_time)
+
+            except Exception as e:
+                last_exception = e
+                self.logger.error(f"Unexpected error for chunk {chunk_id}: {e}")
+                break
+
+        # All retries failed
+        error_msg = f"Failed to generate audio for chunk {chunk_id} after {self.max_retries} attempts"
+        if last_exception:
+            error_msg += f": {str(last_exception)}"
+
         self.logger.error(error_msg)
         raise Exception(error_msg)
\ No newline at end of file